@@ -2,11 +2,14 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, verify_jwt_in_request
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import os
 import google.generativeai as genai
+from profiling import init_profiling
+from encoding import init_encoding, immutable
+from sharding import ShardRouter, ShardedSession, shard_binds_from_uris
 
 # Load environment variables
 load_dotenv()
@@ -18,20 +21,40 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=7)
-app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL') or f"mysql+pymysql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# Sharding: users live on one of SHARD_DATABASE_URIS, the default database keeps the user directory
+app.config['SQLALCHEMY_BINDS'] = shard_binds_from_uris(os.getenv('SHARD_DATABASE_URIS'))
+
+# Response encoding
+app.config['JSON_PROVIDER'] = os.getenv('JSON_PROVIDER', 'fast')
+app.config['COMPRESSION_ENABLED'] = os.getenv('COMPRESSION_ENABLED', 'True') == 'True'
+app.config['COMPRESSION_MIN_SIZE'] = int(os.getenv('COMPRESSION_MIN_SIZE', 500))
+app.config['COMPRESSION_CACHE_SIZE'] = int(os.getenv('COMPRESSION_CACHE_SIZE', 128))
+
+# Profiling (opt-in)
+app.config['PROFILING_ENABLED'] = os.getenv('PROFILING_ENABLED', 'False') == 'True'
+app.config['PROFILING_SECRET'] = os.getenv('PROFILING_SECRET')
+app.config['PROFILING_SAMPLE_RATE'] = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+app.config['PROFILING_INTERVAL_MS'] = float(os.getenv('PROFILING_INTERVAL_MS', 2))
+app.config['PROFILING_MAX_FILES'] = int(os.getenv('PROFILING_MAX_FILES', 100))
+app.config['PROFILING_TOKEN_MAX_AGE'] = int(os.getenv('PROFILING_TOKEN_MAX_AGE', 300))
+app.config['PROFILING_DIR'] = os.getenv('PROFILING_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+
 # Initialize extensions
 cors_config = {
     "origins": os.getenv('CORS_ORIGINS', 'http://localhost:5173').split(','),
     "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-    "allow_headers": ["Content-Type", "Authorization"],
+    "allow_headers": ["Content-Type", "Authorization", "X-Profile-Token"],
     "supports_credentials": True
 }
 CORS(app, resources={r"/api/*": cors_config})
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={'class_': ShardedSession})
 bcrypt = Bcrypt(app)
 jwt = JWTManager(app)
+init_encoding(app)
+init_profiling(app)
 
 # Configure Gemini AI
 genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
@@ -55,10 +78,22 @@ def expired_token_callback(jwt_header, jwt_payload):
 
 # ==================== DATABASE MODELS ====================
 
+class UserDirectory(db.Model):
+    """Global user directory: allocates user ids and maps users to shards"""
+    __tablename__ = 'user_directory'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    shard = db.Column(db.String(50), nullable=False)
+    moving = db.Column(db.Boolean, default=False, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = {'info': {'sharded': True, 'shard_key': 'id'}}
     
-    id = db.Column(db.Integer, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
     full_name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
@@ -78,6 +113,7 @@ class User(db.Model):
 
 class FinancialData(db.Model):
     __tablename__ = 'financial_data'
+    __table_args__ = {'info': {'sharded': True, 'shard_key': 'user_id'}}
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -129,6 +165,34 @@ class FinancialData(db.Model):
         }
 
 
+shard_router = ShardRouter(db, UserDirectory, app.config['SQLALCHEMY_BINDS'].keys())
+
+
+# ==================== SHARD ROUTING ====================
+
+@app.before_request
+def route_to_user_shard():
+    """Point db.session at the shard of the authenticated user, if any"""
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        # Let @jwt_required on the route report bad tokens
+        return None
+    
+    if identity is None:
+        return None
+    
+    entry = shard_router.use_user_shard(user_id=int(identity))
+    if not entry:
+        return jsonify({'error': 'User not found'}), 404
+    
+    if entry.moving and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+        return jsonify({'error': 'Account is being migrated, please retry shortly'}), 503
+    
+    return None
+
+
 # ==================== HELPER FUNCTIONS ====================
 
 def generate_ai_insights(financial_data):
@@ -198,6 +262,7 @@ def calculate_health_score(financial_data):
 # ==================== ROUTES ====================
 
 @app.route('/api/health', methods=['GET'])
+@immutable
 def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'message': 'Smart Pocket AI Backend is running'}), 200
@@ -219,19 +284,30 @@ def register():
             return jsonify({'error': 'Password must be at least 8 characters long'}), 400
         
         # Check if user exists
-        if User.query.filter_by(email=data['email']).first():
+        if shard_router.lookup(email=data['email']):
             return jsonify({'error': 'Email already registered'}), 409
         
-        # Create new user
         hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+        
+        # Reserve a user id in the directory and route to its shard
+        user_id = shard_router.allocate_user(data['email']).id
+        
+        # Create new user
         new_user = User(
+            id=user_id,
             full_name=data['fullName'],
             email=data['email'],
             password_hash=hashed_password
         )
         
-        db.session.add(new_user)
-        db.session.commit()
+        try:
+            db.session.add(new_user)
+            db.session.commit()
+        except Exception:
+            # The directory entry is already committed, free the email again
+            db.session.rollback()
+            shard_router.release_user(user_id)
+            raise
         
         # Generate JWT token (convert ID to string)
         access_token = create_access_token(identity=str(new_user.id))
@@ -257,8 +333,10 @@ def login():
         if not data.get('email') or not data.get('password'):
             return jsonify({'error': 'Missing email or password'}), 400
         
-        # Find user
-        user = User.query.filter_by(email=data['email']).first()
+        # Find user through the directory, then on its shard
+        user = None
+        if shard_router.use_user_shard(email=data['email']):
+            user = User.query.filter_by(email=data['email']).first()
         
         if not user or not bcrypt.check_password_hash(user.password_hash, data['password']):
             return jsonify({'error': 'Invalid email or password'}), 401
@@ -590,7 +668,7 @@ def get_ai_insights():
 def init_db():
     """Initialize database tables"""
     with app.app_context():
-        db.create_all()
+        shard_router.create_all()
         print("✅ Database tables created successfully!")
 
 
@@ -605,7 +683,7 @@ if __name__ == '__main__':
     debug = os.getenv('DEBUG', 'True') == 'True'
     
     print(f"\n🚀 Smart Pocket AI Backend starting on port {port}...")
-    print(f"📊 Database: {os.getenv('DB_NAME')}")
+    print(f"📊 Database: {os.getenv('DB_NAME')} ({len(shard_router.shard_keys)} shard(s))")
     print(f"🤖 Gemini AI: Configured\n")
     
     app.run(host='0.0.0.0', port=port, debug=debug)
@@ -0,0 +1,118 @@
+"""Micro-benchmark for response encoding.
+
+Seeds an in-memory SQLite database through the real routes, then calls
+every endpoint through app.test_client(). For each endpoint it reports the
+time spent serializing the response with Flask's default JSON provider
+and with FastJSONProvider, and the bytes on the wire for each
+Accept-Encoding the server supports (so compress_response runs as it
+would in production).
+
+Usage:
+    python benchmark_encoding.py [--iterations 200]
+"""
+import os
+
+# Benchmark against a throwaway in-memory database, without shards or profiling
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['SHARD_DATABASE_URIS'] = ''
+os.environ['PROFILING_ENABLED'] = 'False'
+os.environ.setdefault('JWT_SECRET_KEY', 'benchmark-jwt-secret-key-that-is-long-enough')
+
+import app as backend
+from encoding import FastJSONProvider, available_encodings
+from flask.json.provider import DefaultJSONProvider
+import argparse
+import time
+
+ENDPOINTS = [
+    ('GET', '/api/health'),
+    ('GET', '/api/auth/me'),
+    ('GET', '/api/financial-data'),
+    ('GET', '/api/analysis/dashboard'),
+    ('GET', '/api/analysis/insights'),
+    ('GET', '/api/analysis/expense-tips'),
+    ('GET', '/api/analysis/savings-projection'),
+    ('GET', '/api/analysis/location-recommendations'),
+    ('GET', '/api/analysis/ai-insights'),
+]
+
+# Offline stand-in for the Gemini reply, so ai-insights has a realistic size
+SAMPLE_AI_TEXT = (
+    "```json\n{\"insights\": [\"Rent consumes 30% of your salary - consider shared housing\", "
+    "\"Food spending is above the city average\"], \"tips\": [\"Cook at home 3 days a week\", "
+    "\"Use a monthly metro pass\"], \"health_score\": 62, \"projection\": \"...\"}\n```\n"
+) * 20
+
+
+def seed(client):
+    """Create a user with financial data through the API, return auth headers"""
+    with backend.app.app_context():
+        backend.shard_router.create_all()
+
+    response = client.post('/api/auth/register', json={
+        'email': 'benchmark@example.com', 'password': 'password123', 'fullName': 'Benchmark User'
+    })
+    headers = {'Authorization': f"Bearer {response.json['token']}"}
+
+    client.post('/api/financial-data', headers=headers, json={
+        'salary': 50000, 'rent': 15000, 'food': 8000, 'travel': 3000, 'others': 5000,
+        'savingsGoal': 500000, 'goalName': 'Buy a Car', 'targetYears': 3, 'jobType': 'Software Engineer',
+        'city': 'Bangalore', 'area': 'HSR Layout', 'rentBudget': 18000
+    })
+    return headers
+
+
+def install_timed_provider(provider_class, timings):
+    """Use provider_class for jsonify and record how long each response() call takes"""
+    provider = provider_class(backend.app)
+    serialize = provider.response
+
+    def timed_response(*args, **kwargs):
+        start = time.perf_counter()
+        result = serialize(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+        return result
+
+    provider.response = timed_response
+    backend.app.json = provider
+
+
+def serialization_time(client, method, path, headers, provider_class, iterations):
+    timings = []
+    install_timed_provider(provider_class, timings)
+    for _ in range(iterations):
+        client.open(path, method=method, headers=headers)
+    return sum(timings) / len(timings)
+
+
+def run_benchmark(iterations):
+    backend.generate_ai_insights = lambda financial_data: SAMPLE_AI_TEXT
+    client = backend.app.test_client()
+    auth_headers = seed(client)
+    encodings = available_encodings()
+
+    header = f"{'endpoint':<42}{'default µs':>12}{'fast µs':>10}{'speedup':>9}{'identity B':>12}"
+    header += ''.join(f"{encoding + ' B':>10}" for encoding in encodings)
+    print(header)
+    print('-' * len(header))
+
+    for method, path in ENDPOINTS:
+        default_time = serialization_time(client, method, path, auth_headers, DefaultJSONProvider, iterations)
+        fast_time = serialization_time(client, method, path, auth_headers, FastJSONProvider, iterations)
+
+        sizes = [len(client.open(path, method=method, headers=auth_headers).data)]
+        for encoding in encodings:
+            response = client.open(path, method=method, headers=dict(auth_headers, **{'Accept-Encoding': encoding}))
+            sizes.append(len(response.data))
+
+        row = f"{path:<42}{default_time * 1e6:>12.1f}{fast_time * 1e6:>10.1f}{default_time / fast_time:>8.1f}x"
+        row += f"{sizes[0]:>12}" + ''.join(f"{size:>10}" for size in sizes[1:])
+        print(row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark JSON serialization and compression per endpoint')
+    parser.add_argument('--iterations', type=int, default=200, help='requests per endpoint and provider')
+    args = parser.parse_args()
+
+    run_benchmark(args.iterations)
@@ -5,9 +5,19 @@
 CREATE DATABASE IF NOT EXISTS ai_financial_management;
 USE ai_financial_management;
 
--- Users table
-CREATE TABLE IF NOT EXISTS users (
+-- User directory (global): allocates user ids and maps each user to a shard
+CREATE TABLE IF NOT EXISTS user_directory (
     id INT AUTO_INCREMENT PRIMARY KEY,
+    email VARCHAR(120) UNIQUE NOT NULL,
+    shard VARCHAR(50) NOT NULL,
+    moving BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_directory_email (email)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Users table (per shard, ids come from user_directory)
+CREATE TABLE IF NOT EXISTS users (
+    id INT PRIMARY KEY,
     full_name VARCHAR(100) NOT NULL,
     email VARCHAR(120) UNIQUE NOT NULL,
     password_hash VARCHAR(255) NOT NULL,
@@ -15,7 +25,7 @@ CREATE TABLE IF NOT EXISTS users (
     INDEX idx_email (email)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
--- Financial data table
+-- Financial data table (per shard)
 CREATE TABLE IF NOT EXISTS financial_data (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT NOT NULL,
@@ -0,0 +1,167 @@
+"""Response encoding: fast JSON provider and negotiated compression.
+
+FastJSONProvider serializes with orjson when it is installed and falls
+back to the standard library otherwise. Both paths write datetimes as
+ISO 8601 strings (matching the models' to_dict output) and Decimals as
+numbers.
+
+init_encoding also compresses responses with brotli or gzip, picked from
+the client's Accept-Encoding, once they are larger than
+COMPRESSION_MIN_SIZE. Views marked with @immutable return the same
+payload to every client; they skip the size threshold, are compressed at
+the highest level once and are served from an in-memory cache afterwards.
+"""
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+import gzip
+import hashlib
+import json
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/html', 'text/css', 'application/javascript')
+
+
+def _default(o):
+    if isinstance(o, (datetime, date)):
+        return o.isoformat()
+    if isinstance(o, Decimal):
+        return float(o)
+    return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson, with a standard library fallback"""
+
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps_bytes(self, obj, indent=False):
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=_default, option=option)
+
+        return self.dumps(obj, indent=2 if indent else None).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self.dumps_bytes(obj).decode('utf-8')
+
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        if kwargs.get('indent') is None:
+            kwargs.setdefault('separators', (',', ':'))
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+
+        return self._app.response_class(self.dumps_bytes(obj, indent=indent) + b"\n", mimetype=self.mimetype)
+
+
+JSON_PROVIDERS = {
+    'fast': FastJSONProvider,
+    'default': DefaultJSONProvider,
+}
+
+
+def immutable(view):
+    """Mark a view whose payload is shared by all clients, so it is compressed once and cached"""
+    view.immutable_response = True
+    return view
+
+
+def compress(data, encoding, level):
+    """Compress bytes with 'br' or 'gzip'; level is 'fast' or 'best'"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if level == 'best' else 5)
+    return gzip.compress(data, compresslevel=9 if level == 'best' else 6, mtime=0)
+
+
+def available_encodings():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def init_encoding(app):
+    """Install the configured JSON provider and response compression"""
+    provider_class = JSON_PROVIDERS[app.config.get('JSON_PROVIDER', 'fast')]
+    app.json = provider_class(app)
+
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return
+
+    min_size = app.config.get('COMPRESSION_MIN_SIZE', 500)
+    cache_size = app.config.get('COMPRESSION_CACHE_SIZE', 128)
+    encodings = available_encodings()
+    cache = OrderedDict()
+    cache_lock = threading.Lock()
+
+    def cached_compress(data, encoding):
+        key = (encoding, hashlib.blake2b(data, digest_size=16).digest())
+        with cache_lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+
+        compressed = compress(data, encoding, 'best')
+        with cache_lock:
+            cache[key] = compressed
+            while len(cache) > cache_size:
+                cache.popitem(last=False)
+        return compressed
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough
+                or response.is_streamed
+                or response.status_code < 200
+                or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        data = response.get_data()
+        view = app.view_functions.get(request.endpoint)
+        is_immutable = getattr(view, 'immutable_response', False)
+        if len(data) < min_size and not is_immutable:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(encodings)
+        if encoding is None:
+            return response
+
+        if is_immutable:
+            compressed = cached_compress(data, encoding)
+        else:
+            compressed = compress(data, encoding, 'fast')
+
+        if len(compressed) >= len(data):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,187 @@
+"""Opt-in per-request profiling.
+
+A sampling profiler that walks the request thread's stack at a fixed
+interval and writes the result as collapsed stacks (one
+``frame;frame;frame count`` line per unique stack), which can be fed
+straight into flamegraph.pl, speedscope or inferno.
+
+Profiling is off unless PROFILING_ENABLED=True. When it is off no hooks
+or routes are registered, so normal requests pay nothing. When it is on,
+a request is profiled if it carries a valid X-Profile-Token header or is
+picked by PROFILING_SAMPLE_RATE. Tokens have the form ``<expires>.<hmac>``
+and are rejected once expired or if they expire further out than
+PROFILING_TOKEN_MAX_AGE seconds.
+"""
+from flask import request, jsonify, g, send_from_directory, abort
+from collections import Counter
+from datetime import datetime
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+PROFILE_HEADER = 'X-Profile-Token'
+PROFILE_SUFFIX = '.folded'
+
+
+def _signature(secret, expires, method, path):
+    message = f"{expires} {method.upper()} {path}".encode('utf-8')
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def sign_profile_request(secret, method, path, expires_in=300):
+    """Return an X-Profile-Token value for method + path, valid for expires_in seconds"""
+    expires = int(time.time()) + int(expires_in)
+    return f"{expires}.{_signature(secret, expires, method, path)}"
+
+
+def verify_profile_token(secret, token, method, path, max_age):
+    """Check a token's signature and that it expires within max_age seconds from now"""
+    if not secret or not token:
+        return False
+
+    expires, _, signature = token.partition('.')
+    try:
+        expires = int(expires)
+    except ValueError:
+        return False
+
+    now = time.time()
+    if expires < now or expires > now + max_age:
+        return False
+
+    return hmac.compare_digest(signature, _signature(secret, expires, method, path))
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's call stack until stopped"""
+
+    def __init__(self, target_ident, interval):
+        super().__init__(daemon=True)
+        self.target_ident = target_ident
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_ident)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame is not None:
+                module = frame.f_globals.get('__name__', '?')
+                if module == __name__:
+                    # The request is already in teardown, stopping this sampler
+                    break
+                code = frame.f_code
+                stack.append(f"{module}:{code.co_name}:{code.co_firstlineno}")
+                frame = frame.f_back
+            else:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+def init_profiling(app):
+    """Register profiling hooks and routes if PROFILING_ENABLED is set"""
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+
+    profile_dir = app.config['PROFILING_DIR']
+    secret = app.config.get('PROFILING_SECRET')
+    sample_rate = app.config.get('PROFILING_SAMPLE_RATE', 0.0)
+    interval = app.config.get('PROFILING_INTERVAL_MS', 2) / 1000.0
+    max_files = app.config.get('PROFILING_MAX_FILES', 100)
+    token_max_age = app.config.get('PROFILING_TOKEN_MAX_AGE', 300)
+
+    os.makedirs(profile_dir, exist_ok=True)
+
+    def has_valid_token():
+        token = request.headers.get(PROFILE_HEADER)
+        return verify_profile_token(secret, token, request.method, request.path, token_max_age)
+
+    def list_profile_files():
+        files = [name for name in os.listdir(profile_dir) if name.endswith(PROFILE_SUFFIX)]
+        return sorted(files, reverse=True)
+
+    def prune_old_profiles():
+        for name in list_profile_files()[max_files:]:
+            try:
+                os.remove(os.path.join(profile_dir, name))
+            except OSError:
+                pass
+
+    @app.before_request
+    def start_profiler():
+        if request.path.startswith('/api/profiles'):
+            return
+        if not has_valid_token() and random.random() >= sample_rate:
+            return
+
+        sampler = StackSampler(threading.get_ident(), interval)
+        g.profiler = sampler
+        g.profiler_started = time.perf_counter()
+        sampler.start()
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        sampler = g.pop('profiler', None)
+        if sampler is None:
+            return
+
+        stacks = sampler.stop()
+        duration_ms = (time.perf_counter() - g.pop('profiler_started')) * 1000
+        if not stacks:
+            return
+
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+        timestamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        filename = f"{timestamp}-{request.method}-{slug}-{duration_ms:.0f}ms{PROFILE_SUFFIX}"
+
+        try:
+            with open(os.path.join(profile_dir, filename), 'w') as f:
+                for stack, count in stacks.items():
+                    f.write(f"{stack} {count}\n")
+            prune_old_profiles()
+            print(f"🔬 Profiled {request.method} {request.path} -> {filename}")
+        except OSError as e:
+            print(f"❌ Could not write profile: {str(e)}")
+
+    @app.route('/api/profiles', methods=['GET'])
+    def list_profiles():
+        """List recent request profiles"""
+        if not has_valid_token():
+            return jsonify({'error': 'Invalid profile token'}), 403
+
+        limit = max(1, request.args.get('limit', 20, type=int))
+        profiles = []
+        for name in list_profile_files()[:limit]:
+            path = os.path.join(profile_dir, name)
+            profiles.append({
+                'name': name,
+                'size': os.path.getsize(path),
+                'created_at': datetime.utcfromtimestamp(os.path.getmtime(path)).isoformat()
+            })
+
+        return jsonify({'profiles': profiles}), 200
+
+    @app.route('/api/profiles/<name>', methods=['GET'])
+    def get_profile(name):
+        """Download a collapsed-stack profile"""
+        if not has_valid_token():
+            return jsonify({'error': 'Invalid profile token'}), 403
+        if not name.endswith(PROFILE_SUFFIX):
+            abort(404)
+
+        return send_from_directory(profile_dir, name, mimetype='text/plain')
+
+    print(f"🔬 Profiling enabled (sample rate {sample_rate}, output {profile_dir})")
@@ -0,0 +1,224 @@
+"""Move users between shards while the app keeps serving traffic.
+
+Usage:
+    python rebalance_shards.py --backfill            # add directory entries for existing users
+    python rebalance_shards.py --user 42 --to shard_1
+    python rebalance_shards.py --all                 # move every user to its hash home shard
+    python rebalance_shards.py --release             # clear moving flags left by an aborted run
+    python rebalance_shards.py --cleanup             # drop directory entries without a user row
+
+Users are moved in batches. A batch is marked as moving in the directory
+(writes get a 503, reads keep hitting the old shard), then the tool waits
+once for in-flight writes to drain. For each user it copies the rows to
+the target shard, flips the directory entry and deletes the rows from
+the source shard. Rows left behind on a shard by a failed delete are
+overwritten if the user is ever moved back there.
+"""
+from app import app, db, shard_router, User, UserDirectory
+from sharding import DEFAULT_SHARD
+from datetime import datetime, timedelta
+import argparse
+import sqlalchemy as sa
+import time
+
+
+def _user_filter(table, user_id):
+    return table.c[table.info['shard_key']] == user_id
+
+
+def _delete_user_rows(conn, user_id):
+    for table in reversed(shard_router.sharded_tables()):
+        conn.execute(sa.delete(table).where(_user_filter(table, user_id)))
+
+
+def _copy_columns(table):
+    """Columns to copy: surrogate keys are left for the target shard to assign"""
+    shard_key = table.info['shard_key']
+    if shard_key in table.primary_key.columns:
+        return list(table.columns)
+    return [column for column in table.columns if not column.primary_key]
+
+
+def backfill_directory():
+    """Create directory entries for users that predate the directory"""
+    with app.app_context():
+        shards = [DEFAULT_SHARD] + [shard for shard in shard_router.shard_keys if shard != DEFAULT_SHARD]
+        users = User.__table__
+        added = 0
+
+        for shard in shards:
+            engine = shard_router.engine(shard)
+            if not sa.inspect(engine).has_table(users.name):
+                continue
+
+            with engine.connect() as conn:
+                rows = conn.execute(sa.select(users.c.id, users.c.email)).all()
+
+            for user_id, email in rows:
+                if db.session.get(UserDirectory, user_id) is None:
+                    db.session.add(UserDirectory(id=user_id, email=email, shard=shard))
+                    added += 1
+
+        db.session.commit()
+        print(f"📇 Added {added} directory entries.")
+
+
+def release_moving():
+    """Clear moving flags left behind by an aborted run"""
+    with app.app_context():
+        released = UserDirectory.query.filter_by(moving=True).update({'moving': False}, synchronize_session=False)
+        db.session.commit()
+        print(f"🔓 Released {released} user(s).")
+        return released
+
+
+def cleanup_directory(min_age_minutes=10):
+    """Delete directory entries whose user row never made it to their shard.
+
+    Only entries older than min_age_minutes are considered, so registrations
+    that are still in progress keep their reservation.
+    """
+    with app.app_context():
+        users = User.__table__
+        cutoff = datetime.utcnow() - timedelta(minutes=min_age_minutes)
+        removed = 0
+
+        for entry in UserDirectory.query.filter(UserDirectory.created_at < cutoff).all():
+            with shard_router.engine(entry.shard).connect() as conn:
+                exists = conn.execute(sa.select(users.c.id).where(users.c.id == entry.id)).first()
+            if exists is None:
+                db.session.delete(entry)
+                removed += 1
+
+        db.session.commit()
+        print(f"🧹 Removed {removed} orphaned directory entries.")
+        return removed
+
+
+def _copy_user(user_id, source, target):
+    """Copy one user's rows to the target shard and point the directory at it"""
+    tables = shard_router.sharded_tables()
+    target_engine = shard_router.engine(target)
+
+    try:
+        with shard_router.engine(source).connect() as src, target_engine.begin() as dst:
+            # Drop stale rows from an earlier move whose source delete failed
+            _delete_user_rows(dst, user_id)
+            for table in tables:
+                columns = _copy_columns(table)
+                rows = src.execute(sa.select(*columns).where(_user_filter(table, user_id))).mappings().all()
+                if rows:
+                    dst.execute(sa.insert(table), [dict(row) for row in rows])
+
+        entry = db.session.get(UserDirectory, user_id)
+        entry.shard = target
+        entry.moving = False
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        with target_engine.begin() as dst:
+            _delete_user_rows(dst, user_id)
+        print(f"❌ Failed to move user {user_id}: {str(e)}")
+        return False
+
+    print(f"🚚 Moved user {user_id}: {source} -> {target}")
+
+    try:
+        with shard_router.engine(source).begin() as src:
+            _delete_user_rows(src, user_id)
+    except Exception as e:
+        print(f"⚠️ Moved user {user_id} but could not delete rows from {source}: {str(e)}")
+
+    return True
+
+
+def move_users(moves, grace=2.0, batch_size=100):
+    """Move (user_id, target shard) pairs, waiting for writes to drain once per batch"""
+    moved = 0
+    with app.app_context():
+        for start in range(0, len(moves), batch_size):
+            batch = []
+            for user_id, target in moves[start:start + batch_size]:
+                entry = db.session.get(UserDirectory, user_id)
+                if entry is None:
+                    print(f"❌ User {user_id} is not in the directory")
+                    continue
+                shard_router.engine(target)
+                if entry.shard != target:
+                    entry.moving = True
+                    batch.append((user_id, entry.shard, target))
+            db.session.commit()
+
+            if not batch:
+                continue
+
+            try:
+                # Let requests that passed the moving check before it was set finish
+                time.sleep(grace)
+
+                for user_id, source, target in batch:
+                    if _copy_user(user_id, source, target):
+                        moved += 1
+            finally:
+                # Release users whose copy failed or never ran
+                db.session.rollback()
+                UserDirectory.query.filter(
+                    UserDirectory.id.in_([user_id for user_id, _, _ in batch])
+                ).update({'moving': False}, synchronize_session=False)
+                db.session.commit()
+
+    return moved
+
+
+def move_user(user_id, target, grace=2.0):
+    """Move one user's rows to the target shard"""
+    with app.app_context():
+        entry = db.session.get(UserDirectory, user_id)
+        if entry is None:
+            print(f"❌ User {user_id} is not in the directory")
+            return False
+        if entry.shard == target:
+            return True
+
+    return move_users([(user_id, target)], grace=grace) == 1
+
+
+def rebalance_all(grace=2.0, batch_size=100):
+    """Move every user whose shard differs from its hash home shard"""
+    with app.app_context():
+        moves = [
+            (entry.id, shard_router.home_shard(entry.id))
+            for entry in UserDirectory.query.all()
+            if entry.shard != shard_router.home_shard(entry.id)
+        ]
+
+    moved = move_users(moves, grace=grace, batch_size=batch_size)
+    print(f"✅ Rebalance complete: {moved} of {len(moves)} user(s) moved.")
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Move users between database shards')
+    parser.add_argument('--backfill', action='store_true', help='add directory entries for existing users')
+    parser.add_argument('--user', type=int, help='id of the user to move')
+    parser.add_argument('--to', help='target shard, e.g. shard_1')
+    parser.add_argument('--all', action='store_true', help='move every user to its hash home shard')
+    parser.add_argument('--grace', type=float, default=2.0, help='seconds to wait for in-flight writes, once per batch')
+    parser.add_argument('--batch-size', type=int, default=100, help='users marked as moving at a time')
+    parser.add_argument('--release', action='store_true', help='clear moving flags left by an aborted run')
+    parser.add_argument('--cleanup', action='store_true', help='drop directory entries without a user row')
+    parser.add_argument('--min-age', type=float, default=10, help='minutes before --cleanup treats an entry as orphaned')
+    args = parser.parse_args()
+
+    if args.release:
+        release_moving()
+    if args.cleanup:
+        cleanup_directory(min_age_minutes=args.min_age)
+    if args.backfill:
+        backfill_directory()
+    if args.user is not None:
+        if not args.to:
+            parser.error('--user requires --to')
+        move_user(args.user, args.to, grace=args.grace)
+    if args.all:
+        rebalance_all(grace=args.grace, batch_size=args.batch_size)
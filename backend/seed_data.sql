@@ -7,8 +7,15 @@ USE ai_financial_management;
 SET FOREIGN_KEY_CHECKS = 0;
 TRUNCATE TABLE financial_data;
 TRUNCATE TABLE users;
+TRUNCATE TABLE user_directory;
 SET FOREIGN_KEY_CHECKS = 1;
 
+-- Seed User Directory (single database deployment, so every user is on the default shard)
+INSERT INTO user_directory (id, email, shard) VALUES
+(1, 'john@example.com', 'default'),
+(2, 'jane@example.com', 'default'),
+(3, 'mike@example.com', 'default');
+
 -- Seed Users
 -- Passwords are hashed versions of 'password123'
 INSERT INTO users (id, full_name, email, password_hash, created_at) VALUES
@@ -1,4 +1,4 @@
-from app import app, db, User, FinancialData, bcrypt
+from app import app, db, shard_router, User, UserDirectory, FinancialData, bcrypt
 from datetime import datetime
 
 def seed_database():
@@ -7,8 +7,12 @@ def seed_database():
         
         # Clear existing data
         try:
-            db.session.query(FinancialData).delete()
-            db.session.query(User).delete()
+            for shard in shard_router.shard_keys:
+                shard_router.use_shard(shard)
+                db.session.query(FinancialData).delete()
+                db.session.query(User).delete()
+                db.session.commit()
+            db.session.query(UserDirectory).delete()
             db.session.commit()
             print("✨ Cleared existing data.")
         except Exception as e:
@@ -20,38 +24,30 @@ def seed_database():
         password_hash = bcrypt.generate_password_hash('password123').decode('utf-8')
         
         users = [
-            User(
-                full_name='John Doe',
-                email='john@example.com',
-                password_hash=password_hash
-            ),
-            User(
-                full_name='Jane Smith',
-                email='jane@example.com',
-                password_hash=password_hash
-            ),
-            User(
-                full_name='Mike Ross',
-                email='mike@example.com',
-                password_hash=password_hash
-            )
+            ('John Doe', 'john@example.com'),
+            ('Jane Smith', 'jane@example.com'),
+            ('Mike Ross', 'mike@example.com')
         ]
 
-        for user in users:
-            db.session.add(user)
-        
-        db.session.commit()
-        print("👤 Seeded users.")
+        # Each user is allocated in the directory and written to its own shard
+        user_ids = {}
+        for full_name, email in users:
+            entry = shard_router.allocate_user(email)
+            db.session.add(User(
+                id=entry.id,
+                full_name=full_name,
+                email=email,
+                password_hash=password_hash
+            ))
+            db.session.commit()
+            user_ids[email] = entry.id
 
-        # Re-fetch users to get their IDs
-        user_john = User.query.filter_by(email='john@example.com').first()
-        user_jane = User.query.filter_by(email='jane@example.com').first()
-        user_mike = User.query.filter_by(email='mike@example.com').first()
+        print("👤 Seeded users.")
 
         # Create sample financial data
         financial_records = [
             FinancialData(
-                user_id=user_john.id,
+                user_id=user_ids['john@example.com'],
                 salary=50000.0,
                 rent=15000.0,
                 food=8000.0,
@@ -66,7 +62,7 @@ def seed_database():
                 rent_budget=18000.0
             ),
             FinancialData(
-                user_id=user_jane.id,
+                user_id=user_ids['jane@example.com'],
                 salary=75000.0,
                 rent=20000.0,
                 food=10000.0,
@@ -81,7 +77,7 @@ def seed_database():
                 rent_budget=25000.0
             ),
             FinancialData(
-                user_id=user_mike.id,
+                user_id=user_ids['mike@example.com'],
                 salary=40000.0,
                 rent=10000.0,
                 food=7000.0,
@@ -98,9 +94,9 @@ def seed_database():
         ]
 
         for freq in financial_records:
+            shard_router.use_user_shard(user_id=freq.user_id)
             db.session.add(freq)
-        
-        db.session.commit()
+            db.session.commit()
         print("💰 Seeded financial data.")
         print("✅ Database seeding completed successfully!")
 
@@ -0,0 +1,165 @@
+"""User-id based sharding across multiple database binds.
+
+Every shard holds the same per-user tables (users, financial_data). A
+global user directory on the default bind maps each user id and email to
+the shard that owns the user's rows. New users are placed on a shard by
+consistent hashing of their id, so adding a shard only changes the home
+shard of roughly 1/N of the users. After placement the directory is
+authoritative, so users can be moved between shards by rewriting their
+directory entry (see rebalance_shards.py).
+
+Models opt in to sharding through table info:
+
+    __table_args__ = {'info': {'sharded': True, 'shard_key': 'user_id'}}
+
+where ``shard_key`` names the column holding the owning user id.
+
+When no shards are configured, the default bind is the only shard and
+the app behaves exactly as an unsharded deployment.
+"""
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.util import find_tables
+import sqlalchemy as sa
+import sqlalchemy.exc as sa_exc
+import bisect
+import hashlib
+
+DEFAULT_SHARD = 'default'
+SHARD_INFO_KEY = 'shard'
+RING_POINTS_PER_SHARD = 64
+
+
+def _ring_hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+def shard_binds_from_uris(uris):
+    """Build SQLALCHEMY_BINDS entries from a comma separated list of URIs"""
+    uris = [uri.strip() for uri in (uris or '').split(',') if uri.strip()]
+    return {f"shard_{i}": uri for i, uri in enumerate(uris)}
+
+
+def is_sharded_table(table):
+    return table is not None and table.info.get('sharded', False)
+
+
+def _tables_for(mapper, clause):
+    """Tables a statement reads or writes, as far as routing is concerned"""
+    if mapper is not None:
+        try:
+            return [sa.inspect(mapper).local_table]
+        except sa_exc.NoInspectionAvailable:
+            return []
+    if isinstance(clause, sa.Table):
+        return [clause]
+    if isinstance(clause, sa.UpdateBase) and isinstance(clause.table, sa.Table):
+        return [clause.table]
+    if isinstance(clause, sa.Select):
+        return [table for from_ in clause.get_final_froms() for table in find_tables(from_)]
+    if isinstance(clause, sa.ColumnElement):
+        return find_tables(clause, check_columns=True)
+    return []
+
+
+class ShardedSession(Session):
+    """Session that sends sharded tables to the shard selected for this session.
+
+    The shard is stored in ``session.info['shard']`` by ShardRouter.use_shard.
+    Everything else (the user directory) goes to the default bind.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and any(is_sharded_table(table) for table in _tables_for(mapper, clause)):
+            shard = self.info.get(SHARD_INFO_KEY)
+            router = self._db.shard_router
+
+            if shard is None:
+                if router.shard_keys != [DEFAULT_SHARD]:
+                    raise sa_exc.UnboundExecutionError('No shard selected for sharded table')
+                shard = DEFAULT_SHARD
+
+            return router.engine(shard)
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ShardRouter:
+    """Chooses shards for users and routes db.session to them"""
+
+    def __init__(self, db, directory_model, shard_keys):
+        self.db = db
+        self.directory_model = directory_model
+        self.shard_keys = list(shard_keys) or [DEFAULT_SHARD]
+        db.shard_router = self
+
+        ring = sorted(
+            (_ring_hash(f"{shard}#{point}"), shard)
+            for shard in self.shard_keys
+            for point in range(RING_POINTS_PER_SHARD)
+        )
+        self._ring_hashes = [point for point, _ in ring]
+        self._ring_shards = [shard for _, shard in ring]
+
+    def engine(self, shard):
+        if shard == DEFAULT_SHARD:
+            return self.db.engines[None]
+        if shard not in self.shard_keys:
+            raise sa_exc.UnboundExecutionError(f"Unknown shard '{shard}'")
+        return self.db.engines[shard]
+
+    def sharded_tables(self):
+        return [table for table in self.db.metadata.sorted_tables if is_sharded_table(table)]
+
+    def home_shard(self, user_id):
+        """Consistent hash placement for a user id"""
+        index = bisect.bisect(self._ring_hashes, _ring_hash(str(user_id)))
+        return self._ring_shards[index % len(self._ring_shards)]
+
+    def use_shard(self, shard):
+        """Route sharded tables in db.session to the given shard"""
+        self.db.session.info[SHARD_INFO_KEY] = shard
+
+    def lookup(self, user_id=None, email=None):
+        """Return the directory entry for a user id or email"""
+        if user_id is not None:
+            return self.db.session.get(self.directory_model, user_id)
+        return self.directory_model.query.filter_by(email=email).first()
+
+    def use_user_shard(self, user_id=None, email=None):
+        """Route db.session to the shard owning a user, return the directory entry"""
+        entry = self.lookup(user_id=user_id, email=email)
+        if entry is not None:
+            self.use_shard(entry.shard)
+        return entry
+
+    def allocate_user(self, email):
+        """Reserve a global user id for a new user and route db.session to its shard.
+
+        The directory entry is committed on its own, before the user row is
+        written to the shard. If writing the user fails, call release_user;
+        entries orphaned by a crash in between are removed by
+        ``rebalance_shards.py --cleanup``.
+        """
+        entry = self.directory_model(email=email, shard=DEFAULT_SHARD)
+        self.db.session.add(entry)
+        self.db.session.flush()
+
+        entry.shard = self.home_shard(entry.id)
+        self.db.session.commit()
+
+        self.use_shard(entry.shard)
+        return entry
+
+    def release_user(self, user_id):
+        """Delete a directory entry whose user row was never written"""
+        self.directory_model.query.filter_by(id=user_id).delete()
+        self.db.session.commit()
+
+    def create_all(self):
+        """Create the directory on the default bind and user tables on every shard"""
+        sharded = self.sharded_tables()
+        global_tables = [table for table in self.db.metadata.sorted_tables if table not in sharded]
+
+        self.db.metadata.create_all(self.db.engines[None], tables=global_tables)
+        for shard in self.shard_keys:
+            self.db.metadata.create_all(self.engine(shard), tables=sharded)
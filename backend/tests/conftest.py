@@ -0,0 +1,48 @@
+"""Shared fixtures: the app runs against temporary SQLite files.
+
+app.py reads its configuration at import time, so the environment is set
+up here before the first test imports it. The default database holds the
+user directory and two more files act as shards. Profiling is enabled
+but only runs for requests with a signed token.
+"""
+import os
+import tempfile
+
+import pytest
+
+DB_DIR = tempfile.mkdtemp(prefix='smart-pocket-tests-')
+
+os.environ.update({
+    'SECRET_KEY': 'test-secret-key',
+    'JWT_SECRET_KEY': 'test-jwt-secret-key-that-is-long-enough',
+    'DATABASE_URL': f"sqlite:///{os.path.join(DB_DIR, 'directory.db')}",
+    'SHARD_DATABASE_URIS': ','.join(
+        f"sqlite:///{os.path.join(DB_DIR, f'shard{i}.db')}" for i in range(2)
+    ),
+    'PROFILING_ENABLED': 'True',
+    'PROFILING_SECRET': 'test-profiling-secret',
+    'PROFILING_SAMPLE_RATE': '0',
+    'PROFILING_DIR': os.path.join(DB_DIR, 'profiles'),
+})
+
+from app import app as flask_app, db, shard_router  # noqa: E402
+
+
+def _reset_databases():
+    with flask_app.app_context():
+        engines = {None: db.engines[None]}
+        engines.update({shard: shard_router.engine(shard) for shard in shard_router.shard_keys})
+        for engine in engines.values():
+            db.metadata.drop_all(engine)
+        shard_router.create_all()
+
+
+@pytest.fixture
+def app():
+    _reset_databases()
+    yield flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,70 @@
+import gzip
+from datetime import datetime
+from decimal import Decimal
+
+import brotli
+from flask import Flask, jsonify
+
+import encoding
+from encoding import FastJSONProvider, immutable, init_encoding
+
+
+def test_fast_provider_handles_datetime_and_decimal(app):
+    provider = FastJSONProvider(app)
+    body = provider.dumps_bytes({'at': datetime(2024, 1, 2, 3, 4, 5), 'amount': Decimal('12.50')})
+    assert provider.loads(body) == {'at': '2024-01-02T03:04:05', 'amount': 12.5}
+
+
+def test_compression_negotiated_above_threshold(app, client):
+    response = client.post('/api/auth/register', json={'email': 'user@example.com', 'password': 'password123', 'fullName': 'Test User'})
+    token = response.json['token']
+    client.post('/api/financial-data', headers={'Authorization': f"Bearer {token}"}, json={'salary': 50000, 'rent': 15000})
+
+    headers = {'Authorization': f"Bearer {token}"}
+    plain = client.get('/api/analysis/dashboard', headers=headers)
+    assert 'Content-Encoding' not in plain.headers
+
+    gzipped = client.get('/api/analysis/dashboard', headers=dict(headers, **{'Accept-Encoding': 'gzip'}))
+    assert gzipped.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in gzipped.headers['Vary']
+    assert gzip.decompress(gzipped.data) == plain.data
+
+    preferred = client.get('/api/analysis/dashboard', headers=dict(headers, **{'Accept-Encoding': 'gzip;q=0.5, br'}))
+    assert preferred.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(preferred.data) == plain.data
+
+
+def test_small_payloads_not_compressed(app, client):
+    response = client.post('/api/auth/login', json={'email': 'nobody@example.com', 'password': 'password123'}, headers={'Accept-Encoding': 'gzip, br'})
+    assert response.status_code == 401
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_immutable_payload_compressed_once_and_cached(monkeypatch):
+    # A fresh app gets its own, empty compression cache
+    cached_app = Flask(__name__)
+    init_encoding(cached_app)
+
+    @cached_app.route('/shared')
+    @immutable
+    def shared():
+        return jsonify({'status': 'healthy', 'items': list(range(20))})
+
+    calls = []
+    original = encoding.compress
+
+    def counting_compress(data, name, level):
+        calls.append((name, level))
+        return original(data, name, level)
+
+    monkeypatch.setattr(encoding, 'compress', counting_compress)
+    client = cached_app.test_client()
+
+    first = client.get('/shared', headers={'Accept-Encoding': 'br'})
+    assert first.headers['Content-Encoding'] == 'br'
+    assert calls == [('br', 'best')]
+
+    second = client.get('/shared', headers={'Accept-Encoding': 'br'})
+    assert second.data == first.data
+    assert calls == [('br', 'best')]
+    assert brotli.decompress(second.data) == client.get('/shared').data
@@ -0,0 +1,53 @@
+import os
+
+from profiling import sign_profile_request
+
+SECRET = 'test-profiling-secret'
+
+
+def profile_headers(method, path, **kwargs):
+    return {'X-Profile-Token': sign_profile_request(SECRET, method, path, **kwargs)}
+
+
+def list_profiles(client, query=''):
+    return client.get(f"/api/profiles{query}", headers=profile_headers('GET', '/api/profiles'))
+
+
+def register(client, email, headers=None):
+    return client.post(
+        '/api/auth/register',
+        json={'email': email, 'password': 'password123', 'fullName': 'Test User'},
+        headers=headers or {}
+    )
+
+
+def test_signed_request_is_profiled(app, client):
+    before = len(list_profiles(client, '?limit=1000').json['profiles'])
+
+    register(client, 'user0@example.com')
+    assert len(list_profiles(client, '?limit=1000').json['profiles']) == before
+
+    register(client, 'user1@example.com', headers=profile_headers('POST', '/api/auth/register'))
+    profiles = list_profiles(client, '?limit=1000').json['profiles']
+    assert len(profiles) == before + 1
+
+    with open(os.path.join(app.config['PROFILING_DIR'], profiles[0]['name'])) as f:
+        stacks = f.read()
+    assert 'app:register:' in stacks
+    assert 'flask.app:wsgi_app:' in stacks
+    assert ';profiling:' not in stacks
+
+
+def test_expired_or_long_lived_tokens_rejected(app, client):
+    assert client.get('/api/profiles', headers=profile_headers('GET', '/api/profiles', expires_in=-1)).status_code == 403
+    assert client.get('/api/profiles', headers=profile_headers('GET', '/api/profiles', expires_in=10 ** 6)).status_code == 403
+    assert client.get('/api/profiles', headers=profile_headers('GET', '/api/health')).status_code == 403
+    assert client.get('/api/profiles', headers={'X-Profile-Token': 'not-a-token'}).status_code == 403
+    assert client.get('/api/profiles').status_code == 403
+
+
+def test_list_limit_is_at_least_one(app, client):
+    register(client, 'user0@example.com', headers=profile_headers('POST', '/api/auth/register'))
+
+    assert len(list_profiles(client, '?limit=-1').json['profiles']) == 1
+    assert len(list_profiles(client, '?limit=0').json['profiles']) == 1
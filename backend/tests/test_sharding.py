@@ -0,0 +1,290 @@
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+import sqlalchemy.exc as sa_exc
+
+import rebalance_shards
+from app import db, shard_router, bcrypt, User, FinancialData, UserDirectory
+from sharding import DEFAULT_SHARD
+
+FINANCIAL_DATA = {
+    'salary': 50000, 'rent': 15000, 'food': 8000, 'travel': 3000, 'others': 5000,
+    'savingsGoal': 10000, 'goalName': 'Buy a Car', 'targetYears': 3,
+    'jobType': 'Software Engineer', 'city': 'Bangalore', 'area': 'HSR Layout', 'rentBudget': 18000
+}
+
+
+def register(client, email, password='password123'):
+    response = client.post('/api/auth/register', json={'email': email, 'password': password, 'fullName': 'Test User'})
+    assert response.status_code == 201
+    return response.json
+
+
+def auth(token):
+    return {'Authorization': f"Bearer {token}"}
+
+
+def directory_entry(app, user_id):
+    with app.app_context():
+        return db.session.get(UserDirectory, user_id)
+
+
+def row_count(app, shard, table, user_id):
+    with app.app_context():
+        with shard_router.engine(shard).connect() as conn:
+            query = sa.select(sa.func.count()).select_from(table).where(table.c[table.info['shard_key']] == user_id)
+            return conn.execute(query).scalar()
+
+
+def register_with_data(client, count):
+    """Register users with financial data, return {user_id: token}"""
+    tokens = {}
+    for i in range(count):
+        body = register(client, f"user{i}@example.com")
+        response = client.post('/api/financial-data', headers=auth(body['token']), json=dict(FINANCIAL_DATA, salary=50000 + i))
+        assert response.status_code == 201
+        tokens[body['user']['id']] = body['token']
+    return tokens
+
+
+def test_register_places_user_on_home_shard(app, client):
+    users = [register(client, f"user{i}@example.com")['user'] for i in range(6)]
+
+    shards = set()
+    for user in users:
+        entry = directory_entry(app, user['id'])
+        assert entry.shard == shard_router.home_shard(user['id'])
+        assert row_count(app, entry.shard, User.__table__, user['id']) == 1
+        shards.add(entry.shard)
+
+    assert shards == set(shard_router.shard_keys)
+
+
+def test_login_goes_through_directory(app, client):
+    for i in range(4):
+        register(client, f"user{i}@example.com")
+
+    for i in range(4):
+        response = client.post('/api/auth/login', json={'email': f"user{i}@example.com", 'password': 'password123'})
+        assert response.status_code == 200
+        me = client.get('/api/auth/me', headers=auth(response.json['token']))
+        assert me.json['user']['email'] == f"user{i}@example.com"
+
+    assert client.post('/api/auth/login', json={'email': 'user0@example.com', 'password': 'wrong-password'}).status_code == 401
+    assert client.post('/api/auth/login', json={'email': 'nobody@example.com', 'password': 'password123'}).status_code == 401
+
+
+def test_duplicate_email_rejected_across_shards(app, client):
+    for i in range(4):
+        register(client, f"user{i}@example.com")
+
+    # The next id may hash to another shard, the directory still catches it
+    for i in range(4):
+        response = client.post('/api/auth/register', json={'email': f"user{i}@example.com", 'password': 'password123', 'fullName': 'Again'})
+        assert response.status_code == 409
+
+
+def test_financial_and_analysis_routes_use_user_shard(app, client):
+    tokens = register_with_data(client, 4)
+
+    for user_id, token in tokens.items():
+        shard = directory_entry(app, user_id).shard
+        assert row_count(app, shard, FinancialData.__table__, user_id) == 1
+
+        data = client.get('/api/financial-data', headers=auth(token)).json['data']
+        assert data['user_id'] == user_id
+
+        for path in ('dashboard', 'insights', 'expense-tips', 'savings-projection', 'location-recommendations'):
+            assert client.get(f"/api/analysis/{path}", headers=auth(token)).status_code == 200
+
+        dashboard = client.get('/api/analysis/dashboard', headers=auth(token)).json
+        assert dashboard['financial_data']['salary'] == data['salary']
+
+
+def test_writes_blocked_while_moving(app, client):
+    body = register(client, 'user@example.com')
+    token, user_id = body['token'], body['user']['id']
+
+    with app.app_context():
+        db.session.get(UserDirectory, user_id).moving = True
+        db.session.commit()
+
+    assert client.post('/api/financial-data', headers=auth(token), json=FINANCIAL_DATA).status_code == 503
+    assert client.get('/api/auth/me', headers=auth(token)).status_code == 200
+
+
+def test_move_user_copies_rows_with_overlapping_ids(app, client):
+    tokens = register_with_data(client, 6)
+    user_id = next(iter(tokens))
+    source = directory_entry(app, user_id).shard
+    target = next(shard for shard in shard_router.shard_keys if shard != source)
+
+    assert rebalance_shards.move_user(user_id, target, grace=0)
+
+    entry = directory_entry(app, user_id)
+    assert entry.shard == target
+    assert not entry.moving
+    for table in shard_router.sharded_tables():
+        assert row_count(app, source, table, user_id) == 0
+        assert row_count(app, target, table, user_id) == 1
+
+    response = client.get('/api/financial-data', headers=auth(tokens[user_id]))
+    assert response.status_code == 200
+    assert response.json['data']['user_id'] == user_id
+    assert client.post('/api/financial-data', headers=auth(tokens[user_id]), json=FINANCIAL_DATA).status_code == 200
+
+
+def test_rebalance_all_returns_users_home(app, client):
+    tokens = register_with_data(client, 6)
+
+    for user_id in list(tokens)[:3]:
+        home = shard_router.home_shard(user_id)
+        away = next(shard for shard in shard_router.shard_keys if shard != home)
+        assert rebalance_shards.move_user(user_id, away, grace=0)
+
+    assert rebalance_shards.rebalance_all(grace=0, batch_size=2) == 3
+
+    for user_id, token in tokens.items():
+        assert directory_entry(app, user_id).shard == shard_router.home_shard(user_id)
+        assert client.get('/api/financial-data', headers=auth(token)).status_code == 200
+
+
+def test_backfill_picks_up_users_in_default_database(app, client):
+    with app.app_context():
+        default_engine = shard_router.engine(DEFAULT_SHARD)
+        db.metadata.create_all(default_engine, tables=shard_router.sharded_tables())
+        password_hash = bcrypt.generate_password_hash('password123').decode('utf-8')
+        with default_engine.begin() as conn:
+            conn.execute(sa.insert(User.__table__), [
+                {'id': 1, 'full_name': 'Legacy User', 'email': 'legacy@example.com', 'password_hash': password_hash}
+            ])
+            conn.execute(sa.insert(FinancialData.__table__), [{'user_id': 1, 'salary': 40000}])
+
+    rebalance_shards.backfill_directory()
+    assert directory_entry(app, 1).shard == DEFAULT_SHARD
+
+    response = client.post('/api/auth/login', json={'email': 'legacy@example.com', 'password': 'password123'})
+    assert response.status_code == 200
+    token = response.json['token']
+
+    # New users get ids after the backfilled ones
+    assert register(client, 'new@example.com')['user']['id'] == 2
+
+    assert rebalance_shards.rebalance_all(grace=0) == 1
+    assert directory_entry(app, 1).shard == shard_router.home_shard(1)
+    assert row_count(app, DEFAULT_SHARD, User.__table__, 1) == 0
+    assert client.get('/api/financial-data', headers=auth(token)).json['data']['salary'] == 40000
+
+
+def test_register_failure_frees_email(app, client):
+    # A stale row on the home shard makes the user insert fail after the directory commit
+    with app.app_context():
+        with shard_router.engine(shard_router.home_shard(1)).begin() as conn:
+            conn.execute(sa.insert(User.__table__), [
+                {'id': 1, 'full_name': 'Stale', 'email': 'stale@example.com', 'password_hash': 'x'}
+            ])
+
+    response = client.post('/api/auth/register', json={'email': 'user@example.com', 'password': 'password123', 'fullName': 'Test User'})
+    assert response.status_code == 500
+    with app.app_context():
+        assert UserDirectory.query.filter_by(email='user@example.com').first() is None
+
+    with app.app_context():
+        with shard_router.engine(shard_router.home_shard(1)).begin() as conn:
+            conn.execute(sa.delete(User.__table__))
+
+    register(client, 'user@example.com')
+
+
+def test_cleanup_removes_orphaned_directory_entries(app, client):
+    body = register(client, 'user@example.com')
+    old = datetime.utcnow() - timedelta(hours=1)
+
+    with app.app_context():
+        db.session.get(UserDirectory, body['user']['id']).created_at = old
+        db.session.add(UserDirectory(id=100, email='orphan@example.com', shard='shard_0', created_at=old))
+        db.session.add(UserDirectory(id=101, email='pending@example.com', shard='shard_0'))
+        db.session.commit()
+
+    assert rebalance_shards.cleanup_directory(min_age_minutes=10) == 1
+    assert directory_entry(app, 100) is None
+    assert directory_entry(app, 101) is not None
+    assert client.post('/api/auth/login', json={'email': 'user@example.com', 'password': 'password123'}).status_code == 200
+
+
+def test_core_select_routed_to_user_shard(app, client):
+    tokens = register_with_data(client, 4)
+    table = FinancialData.__table__
+
+    with app.app_context():
+        with pytest.raises(sa_exc.UnboundExecutionError):
+            db.session.execute(sa.select(sa.func.count()).select_from(table))
+
+        for user_id in tokens:
+            shard_router.use_user_shard(user_id=user_id)
+            user_ids = db.session.execute(sa.select(table.c.user_id).where(table.c.user_id == user_id)).scalars().all()
+            assert user_ids == [user_id]
+
+
+def test_source_delete_failure_still_releases_user(app, client, monkeypatch):
+    tokens = register_with_data(client, 4)
+    user_id = next(iter(tokens))
+    source = directory_entry(app, user_id).shard
+    target = next(shard for shard in shard_router.shard_keys if shard != source)
+
+    with app.app_context():
+        source_engine = shard_router.engine(source)
+    delete_user_rows = rebalance_shards._delete_user_rows
+
+    def failing_delete(conn, user_id):
+        if conn.engine is source_engine:
+            raise sa_exc.OperationalError('DELETE', {}, Exception('source shard unavailable'))
+        delete_user_rows(conn, user_id)
+
+    monkeypatch.setattr(rebalance_shards, '_delete_user_rows', failing_delete)
+    assert rebalance_shards.move_user(user_id, target, grace=0)
+    monkeypatch.undo()
+
+    entry = directory_entry(app, user_id)
+    assert entry.shard == target
+    assert not entry.moving
+    assert row_count(app, source, User.__table__, user_id) == 1
+    assert client.post('/api/financial-data', headers=auth(tokens[user_id]), json=FINANCIAL_DATA).status_code == 200
+
+    # Moving back over the stale rows replaces them
+    assert rebalance_shards.move_user(user_id, source, grace=0)
+    for table in shard_router.sharded_tables():
+        assert row_count(app, source, table, user_id) == 1
+        assert row_count(app, target, table, user_id) == 0
+
+
+def test_aborted_batch_releases_moving_flags(app, client, monkeypatch):
+    tokens = register_with_data(client, 4)
+    moves = []
+    for user_id in tokens:
+        home = shard_router.home_shard(user_id)
+        moves.append((user_id, next(shard for shard in shard_router.shard_keys if shard != home)))
+
+    def interrupted_copy(user_id, source, target):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(rebalance_shards, '_copy_user', interrupted_copy)
+    with pytest.raises(KeyboardInterrupt):
+        rebalance_shards.move_users(moves, grace=0)
+
+    for user_id, token in tokens.items():
+        assert not directory_entry(app, user_id).moving
+        assert client.post('/api/financial-data', headers=auth(token), json=FINANCIAL_DATA).status_code == 200
+
+
+def test_release_clears_leftover_moving_flags(app, client):
+    tokens = register_with_data(client, 3)
+
+    with app.app_context():
+        UserDirectory.query.update({'moving': True})
+        db.session.commit()
+
+    assert rebalance_shards.release_moving() == 3
+    for user_id, token in tokens.items():
+        assert client.post('/api/financial-data', headers=auth(token), json=FINANCIAL_DATA).status_code == 200